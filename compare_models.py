@@ -5,11 +5,15 @@
 
 import pybamm
 import sys
+import os
+import hashlib
 import pickle
 import matplotlib
 import matplotlib.pyplot as plt
 import shared
 import numpy as np
+import scipy.interpolate as interp
+from concurrent.futures import ThreadPoolExecutor
 
 # set style
 matplotlib.rc_file("_matplotlibrc", use_default_template=True)
@@ -23,7 +27,7 @@ pybamm.set_logging_level("INFO")
 "-----------------------------------------------------------------------------"
 "Load comsol data"
 
-comsol_variables = pickle.load(open("comsol_data/comsol_1plus1D_3C.pickle", "rb"))
+comsol_variables = shared.load_comsol_data("comsol_data/comsol_1plus1D_3C.pickle")
 
 "-----------------------------------------------------------------------------"
 "Set up and solve pybamm simulation"
@@ -42,48 +46,94 @@ param = dfn.default_parameter_values
 param.update({"C-rate": 3})
 
 
-# process model and geometry, and discretise
+# set mesh points (shared by all of the models; each mesh only uses the
+# variables present in its own geometry)
+var = pybamm.standard_spatial_vars
+npts = 16
+var_pts = {
+    var.x_n: npts,
+    var.x_s: npts,
+    var.x_p: npts,
+    var.r_n: npts,
+    var.r_p: npts,
+    var.z: npts,
+}
+# the current collector model lives only in z, so its mesh does not need the
+# through-cell or particle variables
+var_pts_cc = {var.z: npts}
+
+# process model and geometry, and discretise. The processed models are cached
+# on disk, since the symbolic processing dominates start-up time on repeat runs
+cache_dir = "cache"
+os.makedirs(cache_dir, exist_ok=True)
+
 meshes = {}
 for name, model in models.items():
-    param.process_model(model)
-    geometry = model.default_geometry
-    param.process_geometry(geometry)
-
-    # set mesh
-    var = pybamm.standard_spatial_vars
-    submesh_types = model.default_submesh_types
-    # set npts
-    var = pybamm.standard_spatial_vars
-    npts = 16
-    var_pts = {
-        var.x_n: npts,
-        var.x_s: npts,
-        var.x_p: npts,
-        var.r_n: npts,
-        var.r_p: npts,
-        var.z: npts,
-    }
-    meshes[name] = pybamm.Mesh(geometry, submesh_types, var_pts)
-    disc = pybamm.Discretisation(meshes[name], model.default_spatial_methods)
-    disc.process_model(model, check_model=False)
+    # the cache key covers everything this script varies in the set-up: the
+    # model, the mesh points, the C-rate and the pybamm version
+    key = hashlib.sha1(
+        repr((name, npts, param["C-rate"], pybamm.__version__)).encode()
+    ).hexdigest()[:12]
+    cache_file = os.path.join(cache_dir, "compare_models_{}.pickle".format(key))
+    if os.path.isfile(cache_file):
+        # the parameter values are restored from the cache too, so warm runs
+        # pair the models with the same ParameterValues state that processed
+        # them on the cold run
+        models[name], meshes[name], param = pickle.load(open(cache_file, "rb"))
+    else:
+        param.process_model(model)
+        geometry = model.default_geometry
+        param.process_geometry(geometry)
+        var_pts_model = var_pts_cc if name == "Current collector" else var_pts
+        meshes[name] = pybamm.Mesh(
+            geometry, model.default_submesh_types, var_pts_model
+        )
+        disc = pybamm.Discretisation(meshes[name], model.default_spatial_methods)
+        disc.process_model(model, check_model=False)
+        # function parameters are loaded from file paths by pybamm and may
+        # not pickle by reference; a failed dump only disables the cache
+        # instead of crashing the completed set-up
+        try:
+            with open(cache_file, "wb") as f:
+                pickle.dump((model, meshes[name], param), f)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            os.remove(cache_file)
+
+# rebind the named models in case they were loaded from the cache
+cc_model = models["Current collector"]
+dfn_av = models["Average DFN"]
+dfn = models["1+1D DFN"]
 
 # discharge timescale
-tau = param.evaluate(pybamm.standard_parameters_lithium_ion.tau_discharge)
+tau = shared.evaluate_parameter(
+    param, pybamm.standard_parameters_lithium_ion.tau_discharge
+)
 
 # solve model at comsol times
 t_eval = comsol_variables["time"] / tau
 
-solutions = {}
-for name, model in models.items():
+
+def solve_model(name_and_model):
+    "Solve a single model, with its own solver instance for thread safety"
+    name, model = name_and_model
     if name == "Current collector":
         solver = pybamm.AlgebraicSolver(tol=1e-6)
-        solutions[name] = solver.solve(model)
+        return solver.solve(model)
     else:
-        # solver
         solver = pybamm.CasadiSolver(
             atol=1e-6, rtol=1e-6, root_tol=1e-3, root_method="hybr", mode="fast"
         )
-        solutions[name] = solver.solve(model, t_eval)
+        return solver.solve(model, t_eval)
+
+
+# the models are independent once discretised, so solve them concurrently.
+# Threads rather than processes: dispatching to a process pool would have to
+# pickle the models, whose expression trees reference function parameters
+# that pybamm loads from file paths (the same caveat the cache dump above
+# guards against), and the solvers spend most of their time in casadi, which
+# releases the GIL, so threads parallelise the solves anyway
+with ThreadPoolExecutor(max_workers=len(models)) as executor:
+    solutions = dict(zip(models.keys(), executor.map(solve_model, models.items())))
 
 
 "-----------------------------------------------------------------------------"
@@ -99,225 +149,182 @@ t_plot = comsol_model.t
 z_plot = comsol_model.z_interp
 t_slices = np.array([600, 1200, 1800, 2400, 3000]) / 3
 
+
+class CachedVariable:
+    """
+    Wrapper for a ProcessedVariable which caches evaluations, since the four
+    plot blocks below repeatedly evaluate variables on the same (t, z) grids.
+    """
+
+    def __init__(self, processed_variable):
+        self.processed_variable = processed_variable
+        self.evaluations = {}
+
+    def __call__(self, t=None, z=None):
+        key = (
+            np.asarray(t).tobytes(),
+            np.asarray(z).tobytes() if z is not None else None,
+        )
+        if key not in self.evaluations:
+            if z is None:
+                self.evaluations[key] = self.processed_variable(t=t)
+            else:
+                self.evaluations[key] = self.processed_variable(t=t, z=z)
+        return self.evaluations[key]
+
+
+# cache of ProcessedVariable objects, so that each variable is only processed
+# once even though several plot blocks use the same variables
+processed_variables = {}
+
+
+def processed_variable(model_name, var):
+    "Return a cached (wrapped) ProcessedVariable for one of the solved models"
+    key = (model_name, var)
+    if key not in processed_variables:
+        if model_name == "Comsol":
+            variables = comsol_model.variables
+        else:
+            variables = models[model_name].variables
+        # the comsol model is evaluated using the 1+1D DFN solution
+        solution_name = "1+1D DFN" if model_name == "Comsol" else model_name
+        processed_variables[key] = CachedVariable(
+            pybamm.ProcessedVariable(
+                variables[var],
+                solutions[solution_name].t,
+                solutions[solution_name].y,
+                mesh=meshes[solution_name],
+            )
+        )
+    return processed_variables[key]
+
 # get processed potentials from DFNCC
 R_cc = param.process_symbol(
     cc_model.variables["Effective current collector resistance"]
 ).evaluate(t=solutions["Current collector"].t, y=solutions["Current collector"].y)[0][0]
 
-V_av_1D = pybamm.ProcessedVariable(
-    dfn_av.variables["Terminal voltage"],
-    solutions["Average DFN"].t,
-    solutions["Average DFN"].y,
-    mesh=meshes["Average DFN"],
-)
-I_av = pybamm.ProcessedVariable(
-    dfn_av.variables["Total current density"],
-    solutions["Average DFN"].t,
-    solutions["Average DFN"].y,
-    mesh=meshes["Average DFN"],
-)
-
-
-def V_av(t):
-    return V_av_1D(t) - I_av(t) * R_cc
+V_av_1D = processed_variable("Average DFN", "Terminal voltage")
+I_av = processed_variable("Average DFN", "Total current density")
 
+# pre-evaluate the average voltage on the solution time grid and interpolate,
+# rather than evaluating both processed variables on every call
+t_av = solutions["Average DFN"].t
+V_av_entries = V_av_1D(t_av) - I_av(t_av) * R_cc
+V_av = interp.interp1d(t_av, V_av_entries, kind="cubic")
 
 potentials = cc_model.get_processed_potentials(
     solutions["Current collector"], meshes["Current collector"], param, V_av, I_av
 )
 
-# plot negative current collector potential
-var = "Negative current collector potential [V]"
-comsol_var_fun = pybamm.ProcessedVariable(
-    comsol_model.variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-pybamm_var_fun = pybamm.ProcessedVariable(
-    models["1+1D DFN"].variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-
-pybamm_bar_var_fun = potentials[var]
-shared.plot_tz_var(
-    t_plot,
-    z_plot,
-    t_slices,
-    "$\phi^*_{\mathrm{s,cn}}$",
-    "[V]",
-    comsol_var_fun,
-    pybamm_var_fun,
-    pybamm_bar_var_fun,
-    param,
-    cmap="cividis",
-)
-
-# plot positive current collector potential (with respect to terminal voltage)
-var = "Positive current collector potential [V]"
-comsol_var = pybamm.ProcessedVariable(
-    comsol_model.variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-V_comsol = pybamm.ProcessedVariable(
-    comsol_model.variables["Terminal voltage [V]"],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-
-
-def comsol_var_fun(t, z):
-    return comsol_var(t=t, z=z) - V_comsol(t=t)
-
-
-pybamm_var = pybamm.ProcessedVariable(
-    models["1+1D DFN"].variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-V = pybamm.ProcessedVariable(
-    models["1+1D DFN"].variables["Terminal voltage [V]"],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-
-
-def pybamm_var_fun(t, z):
-    return pybamm_var(t=t, z=z) - V(t=t)
-
-
-pybamm_bar_var = potentials[var]
-
-pot_scale = param.evaluate(pybamm.standard_parameters_lithium_ion.potential_scale)
-U_ref = param.evaluate(pybamm.standard_parameters_lithium_ion.U_p_ref) - param.evaluate(
-    pybamm.standard_parameters_lithium_ion.U_n_ref
-)
-
-
-def V_av_dim(t):
-    return U_ref + V_av(t) * pot_scale
-
-
-def pybamm_bar_var_fun(t, z):
-    return pybamm_bar_var(t=t, z=z) - V_av_dim(t)
-
-
-shared.plot_tz_var(
-    t_plot,
-    z_plot,
-    t_slices,
-    "$\phi^*_{\mathrm{s,cp}} - V^*$",
-    "[V]",
-    comsol_var_fun,
-    pybamm_var_fun,
-    pybamm_bar_var_fun,
-    param,
-    cmap="viridis",
-)
-
-# plot through-cell current
-var = "Current collector current density [A.m-2]"
-comsol_var_fun = pybamm.ProcessedVariable(
-    comsol_model.variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-pybamm_var_fun = pybamm.ProcessedVariable(
-    models["1+1D DFN"].variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-
-I_av = pybamm.ProcessedVariable(
-    dfn_av.variables["Current collector current density [A.m-2]"],
-    solutions["Average DFN"].t,
-    solutions["Average DFN"].y,
-    mesh=meshes["Average DFN"],
-)
-
-
-def pybamm_bar_var_fun(t, z):
-    if t.shape[0] == 1:
-        return np.repeat(I_av(t)[:, np.newaxis], len(z), axis=0)
-    else:
-        return np.transpose(np.repeat(I_av(t)[:, np.newaxis], len(z), axis=1))
-
-
-shared.plot_tz_var(
-    t_plot,
-    z_plot,
-    t_slices,
-    "$\mathcal{I}^*$",
-    "[A/m${}^2$]",
-    comsol_var_fun,
-    pybamm_var_fun,
-    pybamm_bar_var_fun,
-    param,
-    cmap="plasma",
-)
-
-# plot temperature
-T_ref = param.evaluate(pybamm.standard_parameters_lithium_ion.T_ref)
-var = "X-averaged cell temperature [K]"
-comsol_var = pybamm.ProcessedVariable(
-    comsol_model.variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-
-
-def comsol_var_fun(t, z):
-    return comsol_var(t=t, z=z) - T_ref
-
-
-pybamm_var = pybamm.ProcessedVariable(
-    models["1+1D DFN"].variables[var],
-    solutions["1+1D DFN"].t,
-    solutions["1+1D DFN"].y,
-    mesh=meshes["1+1D DFN"],
-)
-
-
-def pybamm_var_fun(t, z):
-    return pybamm_var(t=t, z=z) - T_ref
-
-
-T_av = pybamm.ProcessedVariable(
-    dfn_av.variables["X-averaged cell temperature [K]"],
-    solutions["Average DFN"].t,
-    solutions["Average DFN"].y,
-    mesh=meshes["Average DFN"],
-)
-
-
-def pybamm_bar_var_fun(t, z):
-    if t.shape[0] == 1:
-        return np.repeat(T_av(t)[:, np.newaxis], len(z), axis=0) - T_ref
-    else:
-        return np.transpose(np.repeat(T_av(t)[:, np.newaxis], len(z), axis=1)) - T_ref
-
-
-shared.plot_tz_var(
-    t_plot,
-    z_plot,
-    t_slices,
-    "$\\bar{T}^* - \\bar{T}_0^*$",
-    "[K]",
-    comsol_var_fun,
-    pybamm_var_fun,
-    pybamm_bar_var_fun,
-    param,
-    cmap="inferno",
+# scales needed by the individual plots
+pot_scale = shared.evaluate_parameter(
+    param, pybamm.standard_parameters_lithium_ion.potential_scale
 )
+U_ref = shared.evaluate_parameter(
+    param, pybamm.standard_parameters_lithium_ion.U_p_ref
+) - shared.evaluate_parameter(param, pybamm.standard_parameters_lithium_ion.U_n_ref)
+T_ref = shared.evaluate_parameter(param, pybamm.standard_parameters_lithium_ion.T_ref)
+
+# interpolant for the dimensional average voltage on the solution time grid
+V_av_dim = interp.interp1d(t_av, U_ref + V_av_entries * pot_scale, kind="cubic")
+
+
+def subtract_const(var_fun, const):
+    "Wrap a (t, z) variable so a constant is subtracted from its values"
+
+    def fun(t, z):
+        return var_fun(t=t, z=z) - const
+
+    return fun
+
+
+def subtract_time_fun(var_fun, time_fun):
+    "Wrap a (t, z) variable so a time-dependent profile is subtracted"
+
+    def fun(t, z):
+        return var_fun(t=t, z=z) - time_fun(t)
+
+    return fun
+
+
+def broadcast_average(av_fun):
+    """
+    Broadcast a z-averaged (time only) variable to the (z, t) plotting shape
+    without copying; np.atleast_1d keeps this branch-free for any t.
+    """
+
+    def fun(t, z):
+        t = np.atleast_1d(t)
+        return np.broadcast_to(av_fun(t)[np.newaxis, :], (len(z), t.size))
+
+    return fun
+
+
+phi_s_cn = "Negative current collector potential [V]"
+phi_s_cp = "Positive current collector potential [V]"
+I_density = "Current collector current density [A.m-2]"
+T_av_var = "X-averaged cell temperature [K]"
+
+# the four plots, as (label, units, cmap) plus the comsol, 1+1D DFN and DFNCC
+# variable functions. The positive potential is plotted with respect to the
+# terminal voltage, and the temperature with respect to its reference value
+plots = [
+    {
+        "label": "$\phi^*_{\mathrm{s,cn}}$",
+        "units": "[V]",
+        "cmap": "cividis",
+        "comsol_fun": processed_variable("Comsol", phi_s_cn),
+        "pybamm_fun": processed_variable("1+1D DFN", phi_s_cn),
+        "bar_fun": potentials[phi_s_cn],
+    },
+    {
+        "label": "$\phi^*_{\mathrm{s,cp}} - V^*$",
+        "units": "[V]",
+        "cmap": "viridis",
+        "comsol_fun": subtract_time_fun(
+            processed_variable("Comsol", phi_s_cp),
+            processed_variable("Comsol", "Terminal voltage [V]"),
+        ),
+        "pybamm_fun": subtract_time_fun(
+            processed_variable("1+1D DFN", phi_s_cp),
+            processed_variable("1+1D DFN", "Terminal voltage [V]"),
+        ),
+        "bar_fun": subtract_time_fun(potentials[phi_s_cp], V_av_dim),
+    },
+    {
+        "label": "$\mathcal{I}^*$",
+        "units": "[A/m${}^2$]",
+        "cmap": "plasma",
+        "comsol_fun": processed_variable("Comsol", I_density),
+        "pybamm_fun": processed_variable("1+1D DFN", I_density),
+        "bar_fun": broadcast_average(processed_variable("Average DFN", I_density)),
+    },
+    {
+        "label": "$\\bar{T}^* - \\bar{T}_0^*$",
+        "units": "[K]",
+        "cmap": "inferno",
+        "comsol_fun": subtract_const(processed_variable("Comsol", T_av_var), T_ref),
+        "pybamm_fun": subtract_const(
+            processed_variable("1+1D DFN", T_av_var), T_ref
+        ),
+        "bar_fun": subtract_const(
+            broadcast_average(processed_variable("Average DFN", T_av_var)), T_ref
+        ),
+    },
+]
+
+for plot in plots:
+    shared.plot_tz_var(
+        t_plot,
+        z_plot,
+        t_slices,
+        plot["label"],
+        plot["units"],
+        plot["comsol_fun"],
+        plot["pybamm_fun"],
+        plot["bar_fun"],
+        param,
+        cmap=plot["cmap"],
+    )
 
 plt.show()
@@ -0,0 +1,17 @@
+#
+# Convert the pickled comsol data dictionaries to .npz archives. Unlike the
+# pickles, the archives are loaded lazily by np.load, so scripts only read the
+# arrays they actually access
+#
+
+import glob
+import os
+import pickle
+
+import numpy as np
+
+for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.pickle"))):
+    data = pickle.load(open(filename, "rb"))
+    npz_filename = os.path.splitext(filename)[0] + ".npz"
+    np.savez(npz_filename, **data)
+    print("Converted {} -> {}".format(filename, npz_filename))
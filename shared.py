@@ -1,9 +1,43 @@
+import os
+import pickle
+
 import pybamm
 import numpy as np
 import scipy.interpolate as interp
 import matplotlib.pyplot as plt
 
 
+def load_comsol_data(filename):
+    """
+    Load a dictionary of comsol data arrays. If an .npz version of the file
+    exists (see comsol_data/convert_pickle_to_npz.py) it is preferred, since
+    np.load reads the arrays lazily as they are accessed instead of
+    deserializing the whole file up front.
+    """
+    npz_filename = os.path.splitext(filename)[0] + ".npz"
+    if os.path.isfile(npz_filename):
+        return np.load(npz_filename)
+    return pickle.load(open(filename, "rb"))
+
+
+# cache for evaluate_parameter, keyed on the parameter values and symbol
+# object identities
+_parameter_cache = {}
+
+
+def evaluate_parameter(param, symbol):
+    """
+    Evaluate a scalar parameter symbol, caching the result so that repeated
+    calls do not re-walk the expression tree. Only use this for parameter
+    values that do not change between evaluations: the cache is keyed on
+    object identity, so it cannot see in-place updates to param.
+    """
+    key = (id(param), id(symbol))
+    if key not in _parameter_cache:
+        _parameter_cache[key] = param.evaluate(symbol)
+    return _parameter_cache[key]
+
+
 def make_comsol_model(comsol_variables, mesh, param, z_interp=None, thermal=True):
     "Make Comsol 'model' for comparison"
     print("Start making COMSOL model")
@@ -119,8 +153,10 @@ def plot_tz_var(
     cmap="viridis",
 ):
     # non-dim t and z
-    L_z = param.evaluate(pybamm.standard_parameters_lithium_ion.L_z)
-    tau = param.evaluate(pybamm.standard_parameters_lithium_ion.tau_discharge)
+    L_z = evaluate_parameter(param, pybamm.standard_parameters_lithium_ion.L_z)
+    tau = evaluate_parameter(
+        param, pybamm.standard_parameters_lithium_ion.tau_discharge
+    )
     z_plot_non_dim = z_plot / L_z
     t_non_dim = t_plot / tau
     t_slices_non_dim = t_slices / tau
@@ -130,8 +166,17 @@ def plot_tz_var(
     fig.subplots_adjust(
         left=0.15, bottom=0.1, right=0.95, top=0.95, wspace=0.4, hspace=0.8
     )
-    # plot comsol var
+
+    # batch-evaluate each variable once on the full grid and once on the slice
+    # times, rather than making a separate call per time slice
     comsol_var = comsol_var_fun(t=t_non_dim, z=z_plot_non_dim)
+    pybamm_var = pybamm_var_fun(t=t_non_dim, z=z_plot_non_dim)
+    pybamm_bar_var = pybamm_bar_var_fun(t=t_non_dim, z=z_plot_non_dim)
+    comsol_var_slices = comsol_var_fun(t=t_slices_non_dim, z=z_plot_non_dim)
+    pybamm_var_slices = pybamm_var_fun(t=t_slices_non_dim, z=z_plot_non_dim)
+    pybamm_bar_var_slices = pybamm_bar_var_fun(t=t_slices_non_dim, z=z_plot_non_dim)
+
+    # plot comsol var
     comsol_var_plot = ax[0, 0].pcolormesh(
         z_plot * 1e3, t_plot, np.transpose(comsol_var), shading="gouraud", cmap=cmap
     )
@@ -155,31 +200,25 @@ def plot_tz_var(
 
     # plot slices
     ccmap = plt.get_cmap("inferno")
-    for ind, t in enumerate(t_slices_non_dim):
+    for ind in range(len(t_slices_non_dim)):
         color = ccmap(float(ind) / len(t_slices))
-        comsol_var_slice = comsol_var_fun(t=t, z=z_plot_non_dim)
-        pybamm_var_slice = pybamm_var_fun(t=t, z=z_plot_non_dim)
-        pybamm_bar_var_slice = pybamm_bar_var_fun(t=np.array([t]), z=z_plot_non_dim)
         ax[0, 1].plot(
-            z_plot * 1e3, comsol_var_slice, "o", fillstyle="none", color=color
+            z_plot * 1e3, comsol_var_slices[:, ind], "o", fillstyle="none", color=color
         )
         ax[0, 1].plot(
             z_plot * 1e3,
-            pybamm_var_slice,
+            pybamm_var_slices[:, ind],
             "-",
             color=color,
             label="{:.0f} s".format(t_slices[ind]),
         )
-        ax[0, 1].plot(z_plot * 1e3, pybamm_bar_var_slice, ":", color=color)
+        ax[0, 1].plot(z_plot * 1e3, pybamm_bar_var_slices[:, ind], ":", color=color)
     # add dummy points for legend of styles
     comsol_p, = ax[0, 1].plot(np.nan, np.nan, "ko", fillstyle="none")
     pybamm_p, = ax[0, 1].plot(np.nan, np.nan, "k-", fillstyle="none")
     pybamm_bar_p, = ax[0, 1].plot(np.nan, np.nan, "k:", fillstyle="none")
 
     # compute errors
-    pybamm_var = pybamm_var_fun(t=t_non_dim, z=z_plot_non_dim)
-    pybamm_bar_var = pybamm_bar_var_fun(t=t_non_dim, z=z_plot_non_dim)
-
     error = np.abs(comsol_var - pybamm_var)
     error_bar = np.abs(comsol_var - pybamm_bar_var)
 
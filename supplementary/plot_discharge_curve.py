@@ -1,13 +1,24 @@
 import pybamm
+import sys
+import os
+import hashlib
 import pickle
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy.interpolate as interp
 
+# make the repository root importable for the shared helpers (the
+# supplementary scripts are run from the root, as the data paths assume)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import shared
+
 # set style
 matplotlib.rc_file("_matplotlibrc", use_default_template=True)
 
+# increase recursion limit for large expression trees
+sys.setrecursionlimit(100000)
+
 pybamm.set_logging_level("INFO")
 
 "-----------------------------------------------------------------------------"
@@ -38,46 +49,79 @@ ax[1, 1].set_ylabel("Difference [K]")
 "Build PyBamm Model"
 C_rates = {"05": 0.5, "1": 1, "2": 2, "3": 3}
 
-# load model and geometry
+# load model and parameters
 options = {"thermal": "x-full"}
 pybamm_model = pybamm.lithium_ion.DFN(options)
-geometry = pybamm_model.default_geometry
-
-# load parameters and process model and geometry
 param = pybamm_model.default_parameter_values
-param.process_model(pybamm_model)
-param.process_geometry(geometry)
 
-# create mesh
+# mesh settings
 var = pybamm.standard_spatial_vars
 var_pts = {var.x_n: 128, var.x_s: 128, var.x_p: 128, var.r_n: 128, var.r_p: 128}
-mesh = pybamm.Mesh(geometry, pybamm_model.default_submesh_types, var_pts)
 
-# discretise model
-spatial_methods = pybamm_model.default_spatial_methods
-disc = pybamm.Discretisation(mesh, pybamm_model.default_spatial_methods)
-disc.process_model(pybamm_model, check_model=False)
-
-# solver
+# process and discretise the model, caching the result on disk since the
+# symbolic processing at this resolution dominates start-up time
+cache_dir = "cache"
+os.makedirs(cache_dir, exist_ok=True)
+key = hashlib.sha1(
+    repr(
+        (
+            pybamm_model.name,
+            sorted(options.items()),
+            tuple(var_pts.values()),
+            pybamm.__version__,
+        )
+    ).encode()
+).hexdigest()[:12]
+cache_file = os.path.join(cache_dir, "plot_discharge_curve_{}.pickle".format(key))
+if os.path.isfile(cache_file):
+    # the parameter values are restored from the cache too, so the
+    # update_model calls in the C-rate loop below act on the same
+    # ParameterValues instance that processed the model on the cold run
+    pybamm_model, disc, mesh, param = pickle.load(open(cache_file, "rb"))
+else:
+    geometry = pybamm_model.default_geometry
+    param.process_model(pybamm_model)
+    param.process_geometry(geometry)
+    mesh = pybamm.Mesh(geometry, pybamm_model.default_submesh_types, var_pts)
+    disc = pybamm.Discretisation(mesh, pybamm_model.default_spatial_methods)
+    disc.process_model(pybamm_model, check_model=False)
+    # function parameters are loaded from file paths by pybamm and may not
+    # pickle by reference; a failed dump only disables the cache instead of
+    # crashing the completed set-up
+    try:
+        with open(cache_file, "wb") as f:
+            pickle.dump((pybamm_model, disc, mesh, param), f)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        os.remove(cache_file)
+
+# solver (shared across all C-rates)
 solver = pybamm.CasadiSolver(atol=1e-6, rtol=1e-6, root_tol=1e-6, mode="fast")
 
+# dimensional voltage cutoff (independent of C-rate, so evaluated once)
+V_cutoff = param.evaluate(
+    pybamm.standard_parameters_lithium_ion.voltage_low_cut_dimensional
+)
+
 "-----------------------------------------------------------------------------"
 "Solve at different C_rates and plot against COMSOL solution"
 
+# precompute the per-C-rate colors and labels used in the plot calls
+colors = tuple("C{}".format(i) for i in range(len(C_rates)))
+pybamm_labels = {key: "PyBaMM ({}C)".format(value) for key, value in C_rates.items()}
+diff_labels = {key: "{}C".format(value) for key, value in C_rates.items()}
+
 counter = 0
-interp_kind = "cubic"
 
 for key, value in C_rates.items():
-    # load comsol_model
-    comsol_variables = pickle.load(
-        open("comsol_data/comsol_1D_{}C.pickle".format(key), "rb")
+    # load comsol_model. CubicSpline is preferred to interp1d(kind="cubic")
+    # since both its construction and its evaluation are much faster
+    comsol_variables = shared.load_comsol_data(
+        "comsol_data/comsol_1D_{}C.pickle".format(key)
     )
     comsol_t = comsol_variables["time"]
-    comsol_voltage = interp.interp1d(
-        comsol_t, comsol_variables["voltage"], kind=interp_kind
-    )
-    comsol_temperature = interp.interp1d(
-        comsol_t, comsol_variables["average temperature"], kind=interp_kind
+    comsol_voltage = interp.CubicSpline(comsol_t, comsol_variables["voltage"])
+    comsol_temperature = interp.CubicSpline(
+        comsol_t, comsol_variables["average temperature"]
     )
 
     # update C_rate
@@ -93,18 +137,22 @@ for key, value in C_rates.items():
     # plot using times up to voltage cut off
     # Note: casadi doesnt support events so we find this time after the solve
     if isinstance(solver, pybamm.CasadiSolver):
-        V_cutoff = param.evaluate(
-            pybamm.standard_parameters_lithium_ion.voltage_low_cut_dimensional
-        )
         voltage = pybamm.ProcessedVariable(
             pybamm_model.variables["Terminal voltage [V]"],
             solution.t,
             solution.y,
             mesh=mesh,
         )(time)
-        # only use times up to the voltage cutoff
-        voltage_OK = voltage[voltage > V_cutoff]
-        time = time[0 : len(voltage_OK)]
+        # only use times up to the voltage cutoff (count the entries above the
+        # cutoff directly rather than materialising them and taking the length)
+        cutoff_idx = np.count_nonzero(voltage > V_cutoff)
+        time = time[:cutoff_idx]
+
+    # evaluate the comsol data once on the full (dimensional) output times and
+    # slice the result, rather than re-interpolating for each plot
+    time_dim = time * tau
+    comsol_voltage_vals = comsol_voltage(time_dim)
+    comsol_temperature_vals = comsol_temperature(time_dim)
 
     # post-process pybamm solution
     pybamm_voltage = pybamm.ProcessedVariable(
@@ -125,47 +173,55 @@ for key, value in C_rates.items():
     # add to plot
     ax[0, 0].plot(
         dis_cap[0::25],
-        comsol_voltage(time[0::25] * tau),
+        comsol_voltage_vals[0::25],
         "o",
         fillstyle="none",
-        color="C{}".format(counter),
+        color=colors[counter],
         label="COMSOL" if counter == 0 else "",
     )
     ax[0, 0].plot(
         dis_cap,
         pybamm_voltage,
         "-",
-        color="C{}".format(counter),
-        label="PyBaMM ({}C)".format(value),
+        color=colors[counter],
+        label=pybamm_labels[key],
     )
     ax[0, 1].plot(
         dis_cap[0::25],
-        comsol_temperature(time[0::25] * tau),
+        comsol_temperature_vals[0::25],
         "o",
         fillstyle="none",
-        color="C{}".format(counter),
+        color=colors[counter],
         label="COMSOL" if counter == 0 else "",
     )
     ax[0, 1].plot(
         dis_cap,
         pybamm_temperature,
         "-",
-        color="C{}".format(counter),
-        label="PyBaMM ({}C)".format(value),
+        color=colors[counter],
+        label=pybamm_labels[key],
     )
+    # take the absolute differences in place so each one costs a single
+    # allocation. (The two plots need separate arrays: matplotlib keeps a
+    # reference to the data rather than copying it, so one shared buffer
+    # would corrupt the earlier line.)
+    voltage_diff = np.subtract(pybamm_voltage, comsol_voltage_vals)
+    np.abs(voltage_diff, out=voltage_diff)
+    temperature_diff = np.subtract(pybamm_temperature, comsol_temperature_vals)
+    np.abs(temperature_diff, out=temperature_diff)
     ax[1, 0].plot(
         dis_cap,
-        np.abs(pybamm_voltage - comsol_voltage(time * tau)),
+        voltage_diff,
         "-",
-        color="C{}".format(counter),
-        label="{}C".format(value),
+        color=colors[counter],
+        label=diff_labels[key],
     )
     ax[1, 1].plot(
         dis_cap,
-        np.abs(pybamm_temperature - comsol_temperature(time * tau)),
+        temperature_diff,
         "-",
-        color="C{}".format(counter),
-        label="{}C".format(value),
+        color=colors[counter],
+        label=diff_labels[key],
     )
 
     # increase counter for labelling
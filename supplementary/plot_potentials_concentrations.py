@@ -3,20 +3,107 @@
 #
 
 import pybamm
+import argparse
+import os
+import hashlib
 import numpy as np
 import pickle
 import scipy.interpolate as interp
+import scipy.signal as signal
 import matplotlib
 import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+
+# numba is optional: if available, the comsol time interpolants are evaluated
+# through a jit-compiled kernel instead of scipy's python dispatch
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _eval_ppoly(t, x, c):
+        """
+        Evaluate the cubic PPoly with breakpoints x and coefficients c (shape
+        (4, len(x) - 1, n_space)) at the times t, returning (n_space, t.size).
+        """
+        out = np.empty((c.shape[2], t.size))
+        for j in range(t.size):
+            i = np.searchsorted(x, t[j]) - 1
+            if i < 0:
+                i = 0
+            elif i > x.size - 2:
+                i = x.size - 2
+            dt = t[j] - x[i]
+            out[:, j] = ((c[0, i] * dt + c[1, i]) * dt + c[2, i]) * dt + c[3, i]
+        return out
+
+    @njit(cache=True)
+    def _eval_cardinal_bspline(t, coeffs, t0, dt):
+        """
+        Evaluate the cardinal cubic B-spline with coefficients coeffs (shape
+        (n_space, n_t)) on the uniform grid t0 + dt * arange(n_t) at the
+        times t, returning (n_space, t.size). Each evaluation is O(1): four
+        basis weights and no breakpoint search.
+        """
+        n_t = coeffs.shape[1]
+        out = np.zeros((coeffs.shape[0], t.size))
+        w = np.empty(4)
+        for j in range(t.size):
+            u = (t[j] - t0) / dt
+            if u < 0.0:
+                u = 0.0
+            elif u > n_t - 1:
+                u = n_t - 1.0
+            i = int(u)
+            if i > n_t - 2:
+                i = n_t - 2
+            f = u - i
+            w[0] = (1.0 - f) ** 3 / 6.0
+            w[1] = (3.0 * f ** 3 - 6.0 * f ** 2 + 4.0) / 6.0
+            w[2] = (-3.0 * f ** 3 + 3.0 * f ** 2 + 3.0 * f + 1.0) / 6.0
+            w[3] = f ** 3 / 6.0
+            for k in range(4):
+                idx = i - 1 + k
+                # mirror boundary handling, matching signal.cspline1d
+                if idx < 0:
+                    idx = -idx
+                elif idx > n_t - 1:
+                    idx = 2 * (n_t - 1) - idx
+                for m in range(coeffs.shape[0]):
+                    out[m, j] += w[k] * coeffs[m, idx]
+        return out
+
 
 # set style
 matplotlib.rc_file("_matplotlibrc", use_default_template=True)
 
+# command line options: by default a cached solution is reused if one exists,
+# so re-rendering the figures does not re-run the solver
+parser = argparse.ArgumentParser(
+    description="Compare thermal models from pybamm and comsol"
+)
+parser.add_argument(
+    "--recompute",
+    action="store_true",
+    help="re-run the solver even if a cached solution exists",
+)
+args = parser.parse_args()
+
 "-----------------------------------------------------------------------------"
 "Load comsol data"
 
 comsol_variables = pickle.load(open("comsol_data/comsol_1D_1C.pickle", "rb"))
 
+# the comsol data is only used for plotting comparisons, so halve the memory
+# traffic of the interpolation by downcasting it to float32. The time trace
+# stays float64 to keep the interpolant breakpoints accurate
+for name, value in comsol_variables.items():
+    if name != "time" and isinstance(value, np.ndarray) and value.dtype == np.float64:
+        comsol_variables[name] = value.astype(np.float32)
+
 "-----------------------------------------------------------------------------"
 "Create and solve pybamm model"
 
@@ -51,10 +138,51 @@ disc.process_model(pybamm_model)
 # discharge timescale
 tau = param.evaluate(pybamm.standard_parameters_lithium_ion.tau_discharge)
 
-# solve model at comsol times
+# solve model at comsol times. The solve dominates the wall time of this
+# script, so the solution arrays are cached on disk and reloaded on repeat
+# runs with an unchanged configuration (pass --recompute to force a solve)
 time = comsol_variables["time"] / tau
-solver = pybamm.CasadiSolver(atol=1e-6, rtol=1e-6, root_tol=1e-6, mode="fast")
-solution = solver.solve(pybamm_model, time)
+
+
+def solve():
+    "Solve the model at the comsol times, returning the solution"
+    solver = pybamm.CasadiSolver(atol=1e-6, rtol=1e-6, root_tol=1e-6, mode="fast")
+    return solver.solve(pybamm_model, time)
+
+
+cache_dir = "cache"
+os.makedirs(cache_dir, exist_ok=True)
+# the cache key covers everything the solve depends on: the model options,
+# the mesh points, the C-rate, the comsol data file and the pybamm version
+key = hashlib.sha1(
+    repr(
+        (
+            sorted(options.items()),
+            tuple(var_pts.values()),
+            param["C-rate"],
+            os.path.getmtime("comsol_data/comsol_1D_1C.pickle"),
+            pybamm.__version__,
+        )
+    ).encode()
+).hexdigest()[:12]
+cache_file = os.path.join(
+    cache_dir, "plot_potentials_solution_{}.pickle".format(key)
+)
+
+
+class CachedSolution:
+    "Container for the solution arrays loaded back from the on-disk cache"
+
+    def __init__(self, t, y):
+        self.t = t
+        self.y = y
+
+
+if os.path.isfile(cache_file) and not args.recompute:
+    solution = CachedSolution(*pickle.load(open(cache_file, "rb")))
+else:
+    solution = solve()
+    pickle.dump((solution.t, solution.y), open(cache_file, "wb"))
 
 
 "-----------------------------------------------------------------------------"
@@ -62,17 +190,79 @@ solution = solver.solve(pybamm_model, time)
 
 whole_cell = ["negative electrode", "separator", "positive electrode"]
 comsol_t = comsol_variables["time"]
+
+# downsample the comsol time grid to roughly twice the solver output cadence
+# before building the interpolants: a denser comsol trace only makes the
+# spline fits and lookups larger without adding information at the plot
+# times. (t_step is 1, i.e. a no-op, when the grids already match)
+t_step = max(1, len(comsol_t) // (2 * len(solution.t)))
+comsol_t = comsol_t[::t_step]
+
+# the comsol output is (typically) on a uniform time grid, which admits the
+# O(1) cardinal B-spline evaluation used in get_interp_fun below
+comsol_dt = np.diff(comsol_t)
+uniform_t = comsol_dt.size > 0 and np.allclose(comsol_dt, comsol_dt[0])
+
 L_x = param.evaluate(pybamm.standard_parameters_lithium_ion.L_x)
 interp_kind = "cubic"
 
 
-def get_interp_fun(variable_name, domain, eval_on_edges=False):
+# cache of combined submeshes keyed by domain, since combine_submeshes does
+# non-trivial work and is called for every interpolated variable
+_submesh_cache = {}
+
+
+def combined_submesh(domain):
+    "Return the (cached) combined submesh for a domain"
+    key = tuple(domain)
+    if key not in _submesh_cache:
+        _submesh_cache[key] = mesh.combine_submeshes(*domain)[0]
+    return _submesh_cache[key]
+
+
+# cache of spatial interpolation weight matrices, keyed on the source and
+# target grids and the interpolation kind. Variables sharing a grid pair then
+# cost one matrix product each rather than a fresh spline fit
+_spatial_weights_cache = {}
+
+
+def spatial_interp_weights(comsol_x, pybamm_x, kind, dtype=np.float64):
     """
-    Create a :class:`pybamm.Function` object using the variable, to allow plotting with
-    :class:`'pybamm.QuickPlot'` (interpolate in space to match edges, and then create
-    function to interpolate in time)
+    Return the matrix W such that W @ variable interpolates a variable sampled
+    on comsol_x onto pybamm_x. Interpolation is linear in the sampled values,
+    so W is found by interpolating the columns of the identity matrix. W is
+    stored in the given dtype so that the product keeps the precision of the
+    variable it is applied to.
     """
-    variable = comsol_variables[variable_name]
+    key = (comsol_x.tobytes(), pybamm_x.tobytes(), kind, np.dtype(dtype).str)
+    if key not in _spatial_weights_cache:
+        eye = np.eye(len(comsol_x))
+        if kind == "linear":
+            W = interp.interp1d(
+                comsol_x, eye, axis=0, kind="linear", assume_sorted=True, copy=False
+            )(pybamm_x)
+        else:
+            W = interp.CubicSpline(comsol_x, eye, axis=0)(pybamm_x)
+        _spatial_weights_cache[key] = W.astype(dtype, copy=False)
+    return _spatial_weights_cache[key]
+
+
+def get_interp_fun(variable_name, domain, eval_on_edges=False, kind=interp_kind):
+    """
+    Create a function of (dimensional) time which returns the comsol variable
+    interpolated onto the pybamm grid for its domain, with shape
+    (n_space, t.size). The comsol data is only used for plotting, so the
+    interpolators are called directly rather than being wrapped as
+    :class:`pybamm.Function` and evaluated through the expression tree. Use
+    kind="linear" for fields which are piecewise-linear in the discretisation
+    (e.g. the current densities on edges), where cubic interpolation adds
+    cost without accuracy.
+    """
+    # the time-axis stride leaves a non-contiguous view; make the array
+    # C-contiguous up front (float32 after the load-time downcast) so the
+    # interpolant fits below get an optimal layout instead of copying
+    # internally
+    variable = np.ascontiguousarray(comsol_variables[variable_name][..., ::t_step])
     if domain == ["negative electrode"]:
         comsol_x = comsol_variables["x_n"]
     elif domain == ["separator"]:
@@ -83,87 +273,269 @@ def get_interp_fun(variable_name, domain, eval_on_edges=False):
         comsol_x = comsol_variables["x"]
     # Make sure to use dimensional space
     if eval_on_edges:
-        pybamm_x = mesh.combine_submeshes(*domain)[0].edges * L_x
+        pybamm_x = combined_submesh(domain).edges * L_x
     else:
-        pybamm_x = mesh.combine_submeshes(*domain)[0].nodes * L_x
-    variable = interp.interp1d(comsol_x, variable, axis=0, kind=interp_kind)(pybamm_x)
-
-    def myinterp(t):
-        return interp.interp1d(comsol_t, variable, kind=interp_kind)(t)[:, np.newaxis]
-
-    # Make sure to use dimensional time
-    fun = pybamm.Function(myinterp, pybamm.t * tau, name=variable_name + "_comsol")
-    fun.domain = domain
-    return fun
-
-
-comsol_c_n_surf = get_interp_fun("c_n_surf", ["negative electrode"])
-comsol_c_e = get_interp_fun("c_e", whole_cell)
-comsol_c_p_surf = get_interp_fun("c_p_surf", ["positive electrode"])
-comsol_phi_n = get_interp_fun("phi_n", ["negative electrode"])
-comsol_phi_e = get_interp_fun("phi_e", whole_cell)
-comsol_phi_p = get_interp_fun("phi_p", ["positive electrode"])
-comsol_i_s_n = get_interp_fun("i_s_n", ["negative electrode"], eval_on_edges=True)
-comsol_i_s_p = get_interp_fun("i_s_p", ["positive electrode"], eval_on_edges=True)
-comsol_i_e_n = get_interp_fun("i_e_n", ["negative electrode"], eval_on_edges=True)
-comsol_i_e_p = get_interp_fun("i_e_p", ["positive electrode"], eval_on_edges=True)
-comsol_voltage = interp.interp1d(
-    comsol_t, comsol_variables["voltage"], kind=interp_kind
-)
-comsol_temperature = get_interp_fun("temperature", whole_cell)
-comsol_temperature_av = interp.interp1d(
-    comsol_t, comsol_variables["average temperature"], kind=interp_kind
-)
-comsol_q_irrev_n = get_interp_fun("Q_irrev_n", ["negative electrode"])
-comsol_q_irrev_p = get_interp_fun("Q_irrev_p", ["positive electrode"])
-comsol_q_rev_n = get_interp_fun("Q_rev_n", ["negative electrode"])
-comsol_q_rev_p = get_interp_fun("Q_rev_p", ["positive electrode"])
-comsol_q_total_n = get_interp_fun("Q_total_n", ["negative electrode"])
-comsol_q_total_s = get_interp_fun("Q_total_s", ["separator"])
-comsol_q_total_p = get_interp_fun("Q_total_p", ["positive electrode"])
-
-# Create comsol model with dictionary of Matrix variables
-comsol_model = pybamm.BaseModel()
-comsol_model.variables = {
-    "Negative particle surface concentration [mol.m-3]": comsol_c_n_surf,
-    "Electrolyte concentration [mol.m-3]": comsol_c_e,
-    "Positive particle surface concentration [mol.m-3]": comsol_c_p_surf,
-    "Current [A]": pybamm_model.variables["Current [A]"],
-    "Negative electrode potential [V]": comsol_phi_n,
-    "Electrolyte potential [V]": comsol_phi_e,
-    "Positive electrode potential [V]": comsol_phi_p,
-    "Negative electrode current density [A.m-2]": comsol_i_s_n,
-    "Positive electrode current density [A.m-2]": comsol_i_s_p,
-    "Negative electrolyte current density [A.m-2]": comsol_i_e_n,
-    "Positive electrolyte current density [A.m-2]": comsol_i_e_p,
-    "Terminal voltage [V]": pybamm.Function(
-        comsol_voltage, pybamm.t * tau, name="voltage_comsol"
+        pybamm_x = combined_submesh(domain).nodes * L_x
+    # interpolate in space onto the pybamm grid with the cached weight matrix
+    # for this grid pair, so the spline fit is shared between the variables
+    # living on the same domain
+    variable = (
+        spatial_interp_weights(comsol_x, pybamm_x, kind, variable.dtype) @ variable
+    )
+
+    if kind == "linear":
+        # the tridiagonal cubic fit is skipped entirely for linear fields
+        time_interp = interp.interp1d(
+            comsol_t, variable, kind="linear", assume_sorted=True, copy=False
+        )
+
+        def myinterp(t):
+            return time_interp(np.atleast_1d(t))
+
+    elif njit is not None and uniform_t:
+        # on a uniform time grid, fit cardinal cubic B-spline coefficients
+        # once and evaluate them in the jitted kernel: per-time cost is four
+        # basis weights, independent of the length of the time trace
+        coeffs = np.apply_along_axis(signal.cspline1d, -1, variable)
+        t0 = comsol_t[0]
+        dt = comsol_dt[0]
+
+        def myinterp(t):
+            t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+            return _eval_cardinal_bspline(t, coeffs, t0, dt)
+
+    else:
+        # build the time interpolant once here, rather than re-fitting the
+        # spline every time the returned function is evaluated. CubicSpline is
+        # preferred to interp1d(kind="cubic") since construction and
+        # evaluation are faster
+        time_interp = interp.CubicSpline(comsol_t, variable, axis=-1)
+
+        if njit is not None:
+            # non-uniform grid: evaluate the spline coefficients directly in
+            # the jitted kernel, skipping the python-level PPoly dispatch
+            ppoly_x = time_interp.x
+            ppoly_c = time_interp.c
+
+            def myinterp(t):
+                t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+                return _eval_ppoly(t, ppoly_x, ppoly_c)
+
+        else:
+
+            def myinterp(t):
+                return time_interp(np.atleast_1d(t))
+
+    return myinterp
+
+
+# table of (variable name, comsol data key, domain, eval_on_edges, kind) for
+# all of the interpolated fields, built in a single pass below so the
+# variables share the comsol time grid and the per-domain pybamm spatial
+# grids. The current densities are piecewise-linear in the finite volume
+# discretisation, so they use linear interpolation
+comsol_fields = [
+    (
+        "Negative particle surface concentration [mol.m-3]",
+        "c_n_surf",
+        ["negative electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Electrolyte concentration [mol.m-3]",
+        "c_e",
+        whole_cell,
+        False,
+        "cubic",
+    ),
+    (
+        "Positive particle surface concentration [mol.m-3]",
+        "c_p_surf",
+        ["positive electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Negative electrode potential [V]",
+        "phi_n",
+        ["negative electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Electrolyte potential [V]",
+        "phi_e",
+        whole_cell,
+        False,
+        "cubic",
+    ),
+    (
+        "Positive electrode potential [V]",
+        "phi_p",
+        ["positive electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Negative electrode current density [A.m-2]",
+        "i_s_n",
+        ["negative electrode"],
+        True,
+        "linear",
+    ),
+    (
+        "Positive electrode current density [A.m-2]",
+        "i_s_p",
+        ["positive electrode"],
+        True,
+        "linear",
     ),
-    "Cell temperature [K]": comsol_temperature,
-    "Volume-averaged cell temperature [K]": pybamm.Function(
-        comsol_temperature_av, pybamm.t * tau, name="temperature_comsol"
+    (
+        "Negative electrolyte current density [A.m-2]",
+        "i_e_n",
+        ["negative electrode"],
+        True,
+        "linear",
     ),
-    "Negative electrode irreversible electrochemical heating [W.m-3]": comsol_q_irrev_n,
-    "Positive electrode irreversible electrochemical heating [W.m-3]": comsol_q_irrev_p,
-    "Negative electrode reversible heating [W.m-3]": comsol_q_rev_n,
-    "Positive electrode reversible heating [W.m-3]": comsol_q_rev_p,
-    "Negative electrode total heating [W.m-3]": comsol_q_total_n,
-    "Separator total heating [W.m-3]": comsol_q_total_s,
-    "Positive electrode total heating [W.m-3]": comsol_q_total_p,
+    (
+        "Positive electrolyte current density [A.m-2]",
+        "i_e_p",
+        ["positive electrode"],
+        True,
+        "linear",
+    ),
+    (
+        "Cell temperature [K]",
+        "temperature",
+        whole_cell,
+        False,
+        "cubic",
+    ),
+    (
+        "Negative electrode irreversible electrochemical heating [W.m-3]",
+        "Q_irrev_n",
+        ["negative electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Positive electrode irreversible electrochemical heating [W.m-3]",
+        "Q_irrev_p",
+        ["positive electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Negative electrode reversible heating [W.m-3]",
+        "Q_rev_n",
+        ["negative electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Positive electrode reversible heating [W.m-3]",
+        "Q_rev_p",
+        ["positive electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Negative electrode total heating [W.m-3]",
+        "Q_total_n",
+        ["negative electrode"],
+        False,
+        "cubic",
+    ),
+    (
+        "Separator total heating [W.m-3]",
+        "Q_total_s",
+        ["separator"],
+        False,
+        "cubic",
+    ),
+    (
+        "Positive electrode total heating [W.m-3]",
+        "Q_total_p",
+        ["positive electrode"],
+        False,
+        "cubic",
+    ),
+]
+
+comsol_voltage = interp.CubicSpline(
+    comsol_t, np.ascontiguousarray(comsol_variables["voltage"][::t_step])
+)
+comsol_temperature_av = interp.CubicSpline(
+    comsol_t, np.ascontiguousarray(comsol_variables["average temperature"][::t_step])
+)
+
+# dictionary of interpolating functions of dimensional time, keyed by display
+# name, already evaluated on the pybamm grids. The comsol data never enters a
+# solve, so no pybamm model is built around it
+comsol_plot = {
+    name: get_interp_fun(key, domain, eval_on_edges=on_edges, kind=kind)
+    for name, key, domain, on_edges, kind in comsol_fields
 }
+comsol_plot.update(
+    {
+        "Terminal voltage [V]": comsol_voltage,
+        "Volume-averaged cell temperature [K]": comsol_temperature_av,
+    }
+)
 
 "-----------------------------------------------------------------------------"
 "Plot comparison"
 
-# Get mesh nodes for spatial plots
-x_n_nodes = mesh.combine_submeshes(*["negative electrode"])[0].nodes
-x_s_nodes = mesh.combine_submeshes(*["separator"])[0].nodes
-x_p_nodes = mesh.combine_submeshes(*["positive electrode"])[0].nodes
-x_nodes = mesh.combine_submeshes(*whole_cell)[0].nodes
-x_n_edges = mesh.combine_submeshes(*["negative electrode"])[0].edges
-x_s_edges = mesh.combine_submeshes(*["separator"])[0].edges
-x_p_edges = mesh.combine_submeshes(*["positive electrode"])[0].edges
-x_edges = mesh.combine_submeshes(*whole_cell)[0].edges
+# Get mesh nodes for spatial plots (the submeshes are shared with the ones
+# used to build the comsol interpolants above)
+x_n_nodes = combined_submesh(["negative electrode"]).nodes
+x_s_nodes = combined_submesh(["separator"]).nodes
+x_p_nodes = combined_submesh(["positive electrode"]).nodes
+x_nodes = combined_submesh(whole_cell).nodes
+x_n_edges = combined_submesh(["negative electrode"]).edges
+x_s_edges = combined_submesh(["separator"]).edges
+x_p_edges = combined_submesh(["positive electrode"]).edges
+x_edges = combined_submesh(whole_cell).edges
+
+
+class CachedVariable:
+    """
+    Wrapper for a ProcessedVariable which caches evaluations keyed on the
+    (x, t) arrays: the x grids are a small fixed set of node/edge arrays, so
+    repeated plots of the same variable skip the interpolation entirely.
+    """
+
+    def __init__(self, processed_variable):
+        self.processed_variable = processed_variable
+        self.evaluations = {}
+
+    def __call__(self, x=None, t=None):
+        key = (
+            np.asarray(x).tobytes() if x is not None else None,
+            np.asarray(t).tobytes(),
+        )
+        if key not in self.evaluations:
+            self.evaluations[key] = self.processed_variable(x=x, t=t)
+        return self.evaluations[key]
+
+
+# cache of ProcessedVariable objects shared by the plotting functions, so each
+# variable is only processed once however many times it is plotted
+_pv_cache = {}
+
+
+def processed_variable(model, name):
+    "Return a cached (wrapped) ProcessedVariable for a variable of the model"
+    key = (id(model), name)
+    if key not in _pv_cache:
+        _pv_cache[key] = CachedVariable(
+            pybamm.ProcessedVariable(
+                model.variables[name], solution.t, solution.y, mesh=mesh
+            )
+        )
+    return _pv_cache[key]
+
 
 # Define plotting functions
 
@@ -199,48 +571,71 @@ def electrode_comparison_plot(
     if plot_times is None:
         plot_times = comsol_variables["time"]
 
-    # Process variables
-
-    # Process pybamm variable in negative electrode
-    pybamm_var_n_fun = pybamm.ProcessedVariable(
-        pybamm_model.variables["Negative " + var], solution.t, solution.y, mesh=mesh
-    )
-
-    # Process pybamm variable in positive electrode
-    pybamm_var_p_fun = pybamm.ProcessedVariable(
-        pybamm_model.variables["Positive " + var], solution.t, solution.y, mesh=mesh
-    )
-
-    # Process comsol variable in negative electrode
-    comsol_var_n_fun = pybamm.ProcessedVariable(
-        comsol_model.variables["Negative " + var], solution.t, solution.y, mesh=mesh
-    )
-
-    # Process comsol variable in positive electrode
-    comsol_var_p_fun = pybamm.ProcessedVariable(
-        comsol_model.variables["Positive " + var], solution.t, solution.y, mesh=mesh
-    )
+    # Process pybamm variables (cached, so repeated plots reuse the same
+    # objects); the comsol variables are plain interpolators of time
+    pybamm_var_n_fun = processed_variable(pybamm_model, "Negative " + var)
+    pybamm_var_p_fun = processed_variable(pybamm_model, "Positive " + var)
+    comsol_var_n_fun = comsol_plot["Negative " + var]
+    comsol_var_p_fun = comsol_plot["Positive " + var]
 
     # Make plot
     fig, ax = plt.subplots(2, 2, sharex=sharex, figsize=(6.4, 4))
     fig.subplots_adjust(
         left=0.1, bottom=0.1, right=0.95, top=0.85, wspace=0.3, hspace=0.5
     )
+    # look up the colormap once for all plot times rather than per iteration
     cmap = plt.get_cmap("inferno")
+    colors = cmap(np.linspace(0.0, 1.0, len(plot_times), endpoint=False))
+
+    # choose the x arrays
+    if eval_on_edges:
+        x_n = x_n_edges
+        x_p = x_p_edges
+    else:
+        x_n = x_n_nodes
+        x_p = x_p_nodes
+
+    # batch-evaluate the variables at all of the plot times in a single call,
+    # rather than re-entering them once per time. The pybamm variables take
+    # non-dimensional time, the comsol interpolators dimensional time. The
+    # four evaluations are independent and spend their time in numpy/scipy C
+    # code, which releases the GIL, so run them concurrently
+    t_dim = np.asarray(plot_times, dtype=np.float64)
+    t_arr = t_dim / tau
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        comsol_n_future = executor.submit(comsol_var_n_fun, t_dim)
+        pybamm_n_future = executor.submit(pybamm_var_n_fun, x=x_n, t=t_arr)
+        comsol_p_future = executor.submit(comsol_var_p_fun, t_dim)
+        pybamm_p_future = executor.submit(pybamm_var_p_fun, x=x_p, t=t_arr)
+        comsol_var_n_all = comsol_n_future.result()
+        pybamm_var_n_all = pybamm_n_future.result()
+        comsol_var_p_all = comsol_p_future.result()
+        pybamm_var_p_all = pybamm_p_future.result()
+
+    # dimensional x in microns, computed once rather than per plot time
+    x_n_um = x_n * L_x * 1e6
+    x_n_um_sparse = x_n_um[0::9]
+    x_p_um = x_p * L_x * 1e6
+    x_p_um_sparse = x_p_um[0::9]
+
+    # take the absolute errors in place on the full (x, t) arrays, avoiding
+    # the per-iteration subtraction and abs temporaries. (matplotlib keeps
+    # references to plotted data rather than copying it, so slices of these
+    # stable arrays are safe where a reused per-iteration buffer would not be)
+    error_n_all = np.subtract(pybamm_var_n_all, comsol_var_n_all)
+    np.abs(error_n_all, out=error_n_all)
+    error_p_all = np.subtract(pybamm_var_p_all, comsol_var_p_all)
+    np.abs(error_p_all, out=error_p_all)
 
     # Loop over plot_times
     for ind, t in enumerate(plot_times):
-        color = cmap(float(ind) / len(plot_times))
+        color = colors[ind]
 
         # negative electrode
-        if eval_on_edges:
-            x_n = x_n_edges
-        else:
-            x_n = x_n_nodes
-        comsol_var_n = comsol_var_n_fun(x=x_n, t=t / tau)
-        pybamm_var_n = pybamm_var_n_fun(x=x_n, t=t / tau)
+        comsol_var_n = comsol_var_n_all[:, ind]
+        pybamm_var_n = pybamm_var_n_all[:, ind]
         ax[0, 0].plot(
-            x_n[0::9] * L_x * 1e6,
+            x_n_um_sparse,
             comsol_var_n[0::9],
             "o",
             color=color,
@@ -248,34 +643,28 @@ def electrode_comparison_plot(
             label="COMSOL" if ind == 0 else "",
         )
         ax[0, 0].plot(
-            x_n * L_x * 1e6,
+            x_n_um,
             pybamm_var_n,
             "-",
             color=color,
             label="PyBaMM" if ind == 0 else "",
         )
-        error_n = np.abs(pybamm_var_n - comsol_var_n)
-        ax[1, 0].plot(x_n * L_x * 1e6, error_n, "-", color=color)
+        ax[1, 0].plot(x_n_um, error_n_all[:, ind], "-", color=color)
 
         # positive electrode
-        if eval_on_edges:
-            x_p = x_p_edges
-        else:
-            x_p = x_p_nodes
-        comsol_var_p = comsol_var_p_fun(x=x_p, t=t / tau)
-        pybamm_var_p = pybamm_var_p_fun(x=x_p, t=t / tau)
+        comsol_var_p = comsol_var_p_all[:, ind]
+        pybamm_var_p = pybamm_var_p_all[:, ind]
         ax[0, 1].plot(
-            x_p[0::9] * L_x * 1e6,
+            x_p_um_sparse,
             comsol_var_p[0::9],
             "o",
             color=color,
             fillstyle="none",
         )
         ax[0, 1].plot(
-            x_p * L_x * 1e6, pybamm_var_p, "-", color=color, label="{:.0f} s".format(t)
+            x_p_um, pybamm_var_p, "-", color=color, label="{:.0f} s".format(t)
         )
-        error_p = np.abs(pybamm_var_p - comsol_var_p)
-        ax[1, 1].plot(x_p * L_x * 1e6, error_p, "-", color=color)
+        ax[1, 1].plot(x_p_um, error_p_all[:, ind], "-", color=color)
 
     # force scientific notation outside 10^{+-2}
     ax[0, 0].ticklabel_format(style="sci", scilimits=(-2, 2), axis="y")
@@ -350,36 +739,56 @@ def whole_cell_comparison_plot(
     if plot_times is None:
         plot_times = comsol_variables["time"]
 
-    # Process variables
-
-    # Process pybamm variable
-    pybamm_var_fun = pybamm.ProcessedVariable(
-        pybamm_model.variables[var], solution.t, solution.y, mesh=mesh
-    )
-
-    # Process comsol variable
-    comsol_var_fun = pybamm.ProcessedVariable(
-        comsol_model.variables[var], solution.t, solution.y, mesh=mesh
-    )
+    # Process pybamm variable (cached, so repeated plots reuse the same
+    # object); the comsol variable is a plain interpolator of time
+    pybamm_var_fun = processed_variable(pybamm_model, var)
+    comsol_var_fun = comsol_plot[var]
 
     # Make plot
     fig, ax = plt.subplots(1, 2, sharex=sharex, figsize=(6.4, 2))
     fig.subplots_adjust(left=0.1, bottom=0.2, right=0.95, top=0.7, wspace=0.3)
+    # look up the colormap once for all plot times rather than per iteration
     cmap = plt.get_cmap("inferno")
+    colors = cmap(np.linspace(0.0, 1.0, len(plot_times), endpoint=False))
+
+    # choose the x array
+    if eval_on_edges:
+        x = x_edges
+    else:
+        x = x_nodes
+
+    # batch-evaluate the variables at all of the plot times in a single call,
+    # rather than re-entering them once per time. The pybamm variable takes
+    # non-dimensional time, the comsol interpolator dimensional time; the two
+    # evaluations are independent, so run them concurrently
+    t_dim = np.asarray(plot_times, dtype=np.float64)
+    t_arr = t_dim / tau
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        comsol_future = executor.submit(comsol_var_fun, t_dim)
+        pybamm_future = executor.submit(pybamm_var_fun, x=x, t=t_arr)
+        comsol_var_all = comsol_future.result()
+        pybamm_var_all = pybamm_future.result()
+
+    # dimensional x in microns, computed once rather than per plot time
+    x_um = x * L_x * 1e6
+    x_um_sparse = x_um[0::8]
+
+    # take the absolute error in place on the full (x, t) array, avoiding the
+    # per-iteration subtraction and abs temporaries. (matplotlib keeps
+    # references to plotted data rather than copying it, so slices of this
+    # stable array are safe where a reused per-iteration buffer would not be)
+    error_all = np.subtract(pybamm_var_all, comsol_var_all)
+    np.abs(error_all, out=error_all)
 
     # Loop over plot_times
     for ind, t in enumerate(plot_times):
-        color = cmap(float(ind) / len(plot_times))
+        color = colors[ind]
 
         # whole cell
-        if eval_on_edges:
-            x = x_edges
-        else:
-            x = x_nodes
-        comsol_var = comsol_var_fun(x=x, t=t / tau)
-        pybamm_var = pybamm_var_fun(x=x, t=t / tau)
+        comsol_var = comsol_var_all[:, ind]
+        pybamm_var = pybamm_var_all[:, ind]
         ax[0].plot(
-            x[0::8] * L_x * 1e6,
+            x_um_sparse,
             comsol_var[0::8],
             "o",
             color=color,
@@ -387,14 +796,15 @@ def whole_cell_comparison_plot(
             label="COMSOL" if ind == 0 else "",
         )
         ax[0].plot(
-            x * L_x * 1e6,
+            x_um,
             pybamm_var,
             "-",
             color=color,
             label="PyBaMM" if ind == 0 else "",
         )
-        error = np.abs(pybamm_var - comsol_var)
-        ax[1].plot(x * L_x * 1e6, error, "-", color=color, label="{:.0f} s".format(t))
+        ax[1].plot(
+            x_um, error_all[:, ind], "-", color=color, label="{:.0f} s".format(t)
+        )
 
     # force scientific notation outside 10^{+-2}
     ax[0].ticklabel_format(style="sci", scilimits=(-2, 2), axis="y")